@@ -37,6 +37,7 @@ setup(
     ],
     install_requires=[
         "opencv-python",
+        "numpy",
     ],
     version="0.0.1",
     author='Peter Reutemann',
@@ -1,2 +1,4 @@
 from ._processor import Processor, Parameters, dummy_frame_processing, dummy_processing_finished, simple_logging, decode_fourcc
 from ._processor import LOGGING_TYPE_DEBUG, LOGGING_TYPE_INFO, LOGGING_TYPE_ERROR
+from ._processor import BACKEND_OPENCV, BACKEND_FFMPEG, BACKEND_NVDEC, BACKEND_GSTREAMER, BACKENDS
+from ._jit import jit_wrap
@@ -0,0 +1,394 @@
+import asyncio
+import cv2
+import json
+import numpy as np
+import os
+import subprocess
+import tempfile
+import threading
+from collections import deque
+
+
+def _to_fourcc(s):
+    """
+    Turns the four letter string into the codec float, as returned by opencv.
+
+    :param s: the four letter string
+    :type s: str
+    :return: the codec as float, 0 if not four letters
+    :rtype: float
+    """
+    if (s is None) or (len(s) != 4):
+        return 0.0
+    return float(cv2.VideoWriter_fourcc(*s))
+
+
+def _to_float(s):
+    """
+    Parses the string as float, also supports fractions like '30000/1001'.
+
+    :param s: the string to parse
+    :type s: str
+    :return: the parsed value, 0 if not parseable
+    :rtype: float
+    """
+    try:
+        if "/" in s:
+            num, den = s.split("/")
+            return float(num) / float(den) if float(den) != 0 else 0.0
+        return float(s)
+    except Exception:
+        return 0.0
+
+
+def _rotation(stream):
+    """
+    Determines the rotation of the video stream from the display matrix side data or,
+    for older ffmpeg versions, from the 'rotate' tag.
+
+    :param stream: the stream information as output by ffprobe
+    :type stream: dict
+    :return: the rotation in degrees (0-359)
+    :rtype: int
+    """
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            return int(round(_to_float(str(side_data["rotation"])))) % 360
+    return int(round(_to_float(stream.get("tags", dict()).get("rotate", "0")))) % 360
+
+
+class BufferPool(object):
+    """
+    Pool of preallocated buffers that get lent out and returned, to avoid allocating
+    memory for each chunk that gets read.
+    """
+
+    def __init__(self, num_buffers=8, buffer_size=64 * 1024):
+        """
+        Initializes the pool.
+
+        :param num_buffers: the number of buffers to allocate
+        :type num_buffers: int
+        :param buffer_size: the size of the buffers in bytes
+        :type buffer_size: int
+        """
+        self.num_buffers = num_buffers
+        self.buffer_size = buffer_size
+        self._buffers = deque(bytearray(buffer_size) for _ in range(num_buffers))
+
+    def acquire(self):
+        """
+        Lends out a buffer.
+
+        :return: the buffer
+        :rtype: bytearray
+        """
+        if len(self._buffers) == 0:
+            raise Exception("No buffers available, %d already in use!" % self.num_buffers)
+        return self._buffers.popleft()
+
+    def release(self, buf):
+        """
+        Returns the buffer to the pool.
+
+        :param buf: the buffer to return
+        :type buf: bytearray
+        """
+        self._buffers.append(buf)
+
+
+def _read_chunk(fd, buf, offset):
+    """
+    Reads a chunk from the file at the specified offset into the buffer.
+
+    :param fd: the file descriptor to read from
+    :type fd: int
+    :param buf: the buffer to read into
+    :type buf: bytearray
+    :param offset: the offset in the file
+    :type offset: int
+    :return: the number of bytes read
+    :rtype: int
+    """
+    if hasattr(os, "preadv"):
+        return os.preadv(fd, [buf], offset)
+    data = os.pread(fd, len(buf), offset)
+    buf[:len(data)] = data
+    return len(data)
+
+
+class FFmpegCapture(object):
+    """
+    Reads the frames of a video file via an ffmpeg process, mimicking the relevant parts
+    of cv2.VideoCapture. The frames get piped as raw YUV420 (12 bits per pixel rather than
+    24 for BGR) and get converted to BGR on retrieval.
+    """
+
+    def __init__(self, video_file, ffmpeg="ffmpeg", ffprobe="ffprobe", async_io=False):
+        """
+        Initializes the capture and starts the ffmpeg process.
+
+        :param video_file: the video file to read
+        :type video_file: str
+        :param ffmpeg: the ffmpeg executable to use
+        :type ffmpeg: str
+        :param ffprobe: the ffprobe executable to use
+        :type ffprobe: str
+        :param async_io: whether to read the file asynchronously and feed it to ffmpeg via stdin,
+                         overlapping disk I/O with decoding (container must support streaming, eg no mp4
+                         with the index at the end)
+        :type async_io: bool
+        """
+        self._video_file = video_file
+        self._ffmpeg = ffmpeg
+        self._ffprobe = ffprobe
+        self._async_io = async_io
+        self._props = dict()
+        self._crop = False
+        self._proc = None
+        self._stderr = None
+        self._feeder = None
+        self._stop_feeding = threading.Event()
+        self._yuv = None
+        self._frames_read = 0
+        self._has_frame = False
+        if self._probe():
+            self._start()
+
+    def _probe(self):
+        """
+        Determines the stream information via ffprobe.
+
+        :return: whether the video stream could be probed
+        :rtype: bool
+        """
+        cmd = [self._ffprobe, "-v", "error", "-select_streams", "v:0", "-of", "json",
+               "-show_entries", "stream=width,height,r_frame_rate,nb_frames,bit_rate,codec_tag_string"
+                                ":stream_tags=rotate:stream_side_data=rotation",
+               self._video_file]
+        try:
+            output = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+            streams = json.loads(output.decode("utf-8")).get("streams", [])
+        except Exception:
+            return False
+        if len(streams) == 0:
+            return False
+
+        stream = streams[0]
+        width = int(stream.get("width", 0))
+        height = int(stream.get("height", 0))
+        # ffmpeg autorotates, i.e., the dimensions of the output are swapped for portrait videos
+        if (_rotation(stream) % 180) == 90:
+            width, height = height, width
+        # yuv420p requires even dimensions, the last column/row gets cropped otherwise
+        self._crop = ((width % 2) == 1) or ((height % 2) == 1)
+        self._props[cv2.CAP_PROP_FRAME_WIDTH] = float(width - width % 2)
+        self._props[cv2.CAP_PROP_FRAME_HEIGHT] = float(height - height % 2)
+        self._props[cv2.CAP_PROP_FPS] = _to_float(stream.get("r_frame_rate", "0"))
+        self._props[cv2.CAP_PROP_FRAME_COUNT] = _to_float(stream.get("nb_frames", "0"))
+        self._props[cv2.CAP_PROP_BITRATE] = _to_float(stream.get("bit_rate", "0")) / 1000.0
+        self._props[cv2.CAP_PROP_FOURCC] = _to_fourcc(stream.get("codec_tag_string"))
+        self._props[cv2.CAP_PROP_CODEC_PIXEL_FORMAT] = _to_fourcc("I420")
+        return (self._props[cv2.CAP_PROP_FRAME_WIDTH] > 0) and (self._props[cv2.CAP_PROP_FRAME_HEIGHT] > 0)
+
+    def _start(self):
+        """
+        Starts the ffmpeg process that pipes the raw frames to stdout.
+        """
+        width = int(self._props[cv2.CAP_PROP_FRAME_WIDTH])
+        height = int(self._props[cv2.CAP_PROP_FRAME_HEIGHT])
+        if self._async_io:
+            cmd = [self._ffmpeg, "-v", "error", "-i", "pipe:0"]
+        else:
+            cmd = [self._ffmpeg, "-nostdin", "-v", "error", "-i", self._video_file]
+        if self._crop:
+            cmd.extend(["-vf", "crop=%d:%d:0:0" % (width, height)])
+        cmd.extend(["-f", "rawvideo", "-pix_fmt", "yuv420p", "-vsync", "0", "pipe:1"])
+        # the error messages get collected in a file rather than a pipe, which could fill up and block ffmpeg
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if self._async_io else None,
+                                          stdout=subprocess.PIPE, stderr=self._stderr)
+        except Exception:
+            self._proc = None
+            self._stderr.close()
+            self._stderr = None
+            return
+        self._yuv = np.empty((height * 3 // 2, width), np.uint8)
+        if self._async_io:
+            self._feeder = threading.Thread(target=asyncio.run, args=(self._feed(),), daemon=True)
+            self._feeder.start()
+
+    async def _feed(self, num_buffers=8, buffer_size=64 * 1024):
+        """
+        Reads the video file in chunks and writes them to the stdin of the ffmpeg process.
+        Reading and writing run concurrently in the executor, with the chunks getting
+        passed on via a queue.
+
+        :param num_buffers: the number of buffers in the pool
+        :type num_buffers: int
+        :param buffer_size: the size of the buffers
+        :type buffer_size: int
+        """
+        loop = asyncio.get_running_loop()
+        pool = BufferPool(num_buffers=num_buffers, buffer_size=buffer_size)
+        # one buffer each is held by the reader and the writer
+        chunks = asyncio.Queue(maxsize=num_buffers - 2)
+        stdin = self._proc.stdin
+
+        async def read():
+            fd = os.open(self._video_file, os.O_RDONLY)
+            try:
+                offset = 0
+                while not self._stop_feeding.is_set():
+                    buf = pool.acquire()
+                    n = await loop.run_in_executor(None, _read_chunk, fd, buf, offset)
+                    if n == 0:
+                        pool.release(buf)
+                        break
+                    offset += n
+                    await chunks.put((buf, n))
+            finally:
+                os.close(fd)
+                await chunks.put(None)
+
+        async def write():
+            try:
+                while True:
+                    item = await chunks.get()
+                    if item is None:
+                        break
+                    buf, n = item
+                    try:
+                        if not self._stop_feeding.is_set():
+                            await loop.run_in_executor(None, stdin.write, memoryview(buf)[:n])
+                    except (BrokenPipeError, ValueError):
+                        self._stop_feeding.set()
+                    finally:
+                        pool.release(buf)
+            finally:
+                try:
+                    stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        await asyncio.gather(read(), write())
+
+    def isOpened(self):
+        """
+        Returns whether the ffmpeg process is running.
+
+        :return: True if running
+        :rtype: bool
+        """
+        return self._proc is not None
+
+    def get(self, prop_id):
+        """
+        Returns the specified property.
+
+        :param prop_id: the cv2.CAP_PROP_* property to return
+        :type prop_id: int
+        :return: the value, 0 if not supported
+        :rtype: float
+        """
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._frames_read)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            fps = self._props.get(cv2.CAP_PROP_FPS, 0.0)
+            if (fps <= 0) or (self._frames_read == 0):
+                return 0.0
+            return (self._frames_read - 1) * 1000.0 / fps
+        return self._props.get(prop_id, 0.0)
+
+    def set(self, prop_id, value):
+        """
+        Setting properties is not supported.
+
+        :param prop_id: the cv2.CAP_PROP_* property to set
+        :type prop_id: int
+        :param value: the value to set
+        :return: always False
+        :rtype: bool
+        """
+        return False
+
+    def _check_exit(self):
+        """
+        Waits for the ffmpeg process to finish after its output has ended and raises an
+        exception with its error messages if it failed, eg when a container that cannot be
+        streamed got piped in with async_io.
+        """
+        if self._proc.wait() == 0:
+            return
+        self._stderr.seek(0)
+        msg = self._stderr.read().decode("utf-8", errors="replace").strip()
+        raise Exception("ffmpeg failed with exit code %d: %s" % (self._proc.returncode, msg))
+
+    def grab(self):
+        """
+        Reads the next raw frame from the ffmpeg process.
+
+        :return: whether a frame was read
+        :rtype: bool
+        """
+        self._has_frame = False
+        if self._proc is None:
+            return False
+        view = memoryview(self._yuv).cast("B")
+        pos = 0
+        while pos < len(view):
+            n = self._proc.stdout.readinto(view[pos:])
+            if not n:
+                self._check_exit()
+                return False
+            pos += n
+        self._frames_read += 1
+        self._has_frame = True
+        return True
+
+    def retrieve(self, image=None):
+        """
+        Converts the last grabbed frame to BGR.
+
+        :param image: the optional array to store the frame in
+        :type image: numpy.ndarray
+        :return: whether successful and the frame
+        :rtype: tuple
+        """
+        if not self._has_frame:
+            return False, None
+        if (image is not None) and (image.shape == (self._yuv.shape[0] * 2 // 3, self._yuv.shape[1], 3)):
+            return True, cv2.cvtColor(self._yuv, cv2.COLOR_YUV2BGR_I420, dst=image)
+        return True, cv2.cvtColor(self._yuv, cv2.COLOR_YUV2BGR_I420)
+
+    def read(self, image=None):
+        """
+        Grabs and retrieves the next frame.
+
+        :param image: the optional array to store the frame in
+        :type image: numpy.ndarray
+        :return: whether successful and the frame
+        :rtype: tuple
+        """
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def release(self):
+        """
+        Stops the ffmpeg process.
+        """
+        if self._proc is None:
+            return
+        self._stop_feeding.set()
+        self._proc.stdout.close()
+        self._proc.terminate()
+        self._proc.wait()
+        if self._feeder is not None:
+            self._feeder.join()
+            self._feeder = None
+        self._stderr.close()
+        self._stderr = None
+        self._proc = None
+        self._has_frame = False
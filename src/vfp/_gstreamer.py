@@ -0,0 +1,80 @@
+import cv2
+import functools
+import os
+import re
+
+
+@functools.lru_cache(maxsize=1)
+def gstreamer_available():
+    """
+    Returns whether opencv was built with GStreamer support.
+
+    :return: True if available
+    :rtype: bool
+    """
+    return re.search(r"GStreamer:\s*YES", cv2.getBuildInformation()) is not None
+
+
+@functools.lru_cache(maxsize=1)
+def is_jetson():
+    """
+    Returns whether running on an NVIDIA Jetson device.
+
+    :return: True if Jetson
+    :rtype: bool
+    """
+    return os.path.exists("/etc/nv_tegra_release")
+
+
+def _bgr_caps(resize):
+    """
+    Returns the caps for BGR output, optionally with width and height.
+
+    :param resize: the optional width and height to resize to
+    :type resize: tuple
+    :return: the caps
+    :rtype: str
+    """
+    if resize is None:
+        return "video/x-raw,format=BGR"
+    return "video/x-raw,format=BGR,width=%d,height=%d" % (resize[0], resize[1])
+
+
+def file_pipeline(video_file, resize=None):
+    """
+    Generates the pipeline for decoding, converting and resizing the frames of a video file.
+    On Jetson devices, hardware decoding is used (H.264 in MP4 containers), otherwise
+    the decoder gets determined by decodebin.
+
+    :param video_file: the video file to decode
+    :type video_file: str
+    :param resize: the optional width and height to resize the frames to
+    :type resize: tuple
+    :return: the pipeline
+    :rtype: str
+    """
+    location = video_file.replace("\\", "\\\\").replace('"', '\\"')
+    if is_jetson():
+        caps = "video/x-raw,format=BGRx"
+        if resize is not None:
+            caps += ",width=%d,height=%d" % (resize[0], resize[1])
+        return 'filesrc location="%s" ! qtdemux ! h264parse ! nvv4l2decoder ! nvvidconv ! %s ! videoconvert ! ' \
+               'video/x-raw,format=BGR ! appsink max-buffers=2' % (location, caps)
+    return 'filesrc location="%s" ! decodebin ! videoconvert ! videoscale ! %s ! appsink max-buffers=2' \
+           % (location, _bgr_caps(resize))
+
+
+def webcam_pipeline(webcam_id, resize=None):
+    """
+    Generates the pipeline for capturing, converting and resizing the frames of a V4L2 webcam.
+    Only the most recent frames are kept.
+
+    :param webcam_id: the ID of the webcam
+    :type webcam_id: int
+    :param resize: the optional width and height to resize the frames to
+    :type resize: tuple
+    :return: the pipeline
+    :rtype: str
+    """
+    return "v4l2src device=/dev/video%d ! videoconvert ! videoscale ! %s ! appsink drop=1 max-buffers=2" \
+           % (webcam_id, _bgr_caps(resize))
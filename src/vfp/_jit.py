@@ -0,0 +1,63 @@
+import warnings
+
+try:
+    import numba
+    from numba.core.dispatcher import Dispatcher
+except ImportError:
+    numba = None
+    Dispatcher = None
+
+_warned = False
+
+
+def jit_wrap(fn, signature=None, **options):
+    """
+    Compiles the frame processing method with numba, if available. As the processor object
+    cannot be handled in nopython mode, the compiled method receives None instead of the processor.
+    The compiled method releases the GIL, so it can run concurrently with decoding (see prefetch).
+    Without numba, a warning is output (once) and the method is returned unchanged.
+
+    :param fn: the method to compile, with the same arguments as process_frame
+    :type fn: function
+    :param signature: the optional numba signature for eager compilation
+    :param options: the options for numba.njit, overriding the defaults (fastmath, cache, nogil);
+                    use parallel=True for methods that use numba.prange
+    :return: the compiled or unchanged method
+    :rtype: function
+    """
+    global _warned
+    if numba is None:
+        if not _warned:
+            warnings.warn("numba not installed, frame processing method does not get compiled!")
+            _warned = True
+        return fn
+    options = dict(dict(fastmath=True, cache=True, nogil=True), **options)
+    if signature is None:
+        return numba.njit(**options)(fn)
+    return numba.njit(signature, **options)(fn)
+
+
+def is_jitted(fn):
+    """
+    Returns whether the method was compiled with numba.
+
+    :param fn: the method to check
+    :type fn: function
+    :return: True if compiled
+    :rtype: bool
+    """
+    return (Dispatcher is not None) and isinstance(fn, Dispatcher)
+
+
+def jitted_frame_processor(fn):
+    """
+    Wraps the numba-compiled frame processing method, passing None instead of the processor.
+
+    :param fn: the compiled method
+    :type fn: function
+    :return: the wrapper
+    :rtype: function
+    """
+    def process_frame(processor, frame, frame_no, pos_msec):
+        return fn(None, frame, frame_no, pos_msec)
+    return process_frame
@@ -0,0 +1,187 @@
+import ctypes
+import cv2
+import numpy as np
+from collections import deque
+
+try:
+    import PyNvVideoCodec as nvc
+except ImportError:
+    nvc = None
+
+
+def nvdec_available():
+    """
+    Returns whether PyNvVideoCodec is installed.
+
+    :return: True if available
+    :rtype: bool
+    """
+    return nvc is not None
+
+
+class NvDecCapture(object):
+    """
+    Reads the frames of a video file using NVIDIA's hardware decoder via PyNvVideoCodec,
+    mimicking the relevant parts of cv2.VideoCapture. The decoded NV12 frames either get
+    returned as is (remaining on the GPU) or get copied to host memory and converted to BGR.
+    """
+
+    def __init__(self, video_file, gpu_id=0, device_frames=False):
+        """
+        Initializes the capture.
+
+        :param video_file: the video file to read
+        :type video_file: str
+        :param gpu_id: the GPU to use for decoding
+        :type gpu_id: int
+        :param device_frames: whether to return the decoded frames in GPU memory rather than as BGR numpy arrays
+        :type device_frames: bool
+        """
+        self._video_file = video_file
+        self._device_frames = device_frames
+        self._props = dict()
+        self._demuxer = None
+        self._decoder = None
+        self._packets = None
+        self._pending = deque()
+        self._frame = None
+        self._frames_read = 0
+        self._width = 0
+        self._height = 0
+        self._nv12 = None
+        if nvc is None:
+            return
+
+        # the container information is obtained via opencv, the frame dimensions via the demuxer
+        probe = cv2.VideoCapture(video_file)
+        if probe.isOpened():
+            for prop in [cv2.CAP_PROP_FPS, cv2.CAP_PROP_FOURCC, cv2.CAP_PROP_FRAME_COUNT, cv2.CAP_PROP_BITRATE]:
+                self._props[prop] = probe.get(prop)
+            self._props[cv2.CAP_PROP_CODEC_PIXEL_FORMAT] = float(cv2.VideoWriter_fourcc(*"NV12"))
+        probe.release()
+        if len(self._props) == 0:
+            return
+
+        try:
+            self._demuxer = nvc.CreateDemuxer(filename=video_file)
+            self._decoder = nvc.CreateDecoder(gpuid=gpu_id, codec=self._demuxer.GetNvCodecId(), cudacontext=0,
+                                              cudastream=0, usedevicememory=device_frames)
+        except Exception:
+            self._demuxer = None
+            self._decoder = None
+            return
+        self._packets = iter(self._demuxer)
+        # unlike opencv, the decoder does not rotate the frames according to the metadata
+        self._width = self._demuxer.Width()
+        self._height = self._demuxer.Height()
+        self._props[cv2.CAP_PROP_FRAME_WIDTH] = float(self._width)
+        self._props[cv2.CAP_PROP_FRAME_HEIGHT] = float(self._height)
+        # NV12 requires even dimensions, odd-sized frames get cropped after conversion
+        self._nv12 = np.empty(((self._height + self._height % 2) * 3 // 2, self._width + self._width % 2), np.uint8)
+
+    def isOpened(self):
+        """
+        Returns whether the decoder is available.
+
+        :return: True if available
+        :rtype: bool
+        """
+        return self._decoder is not None
+
+    def get(self, prop_id):
+        """
+        Returns the specified property.
+
+        :param prop_id: the cv2.CAP_PROP_* property to return
+        :type prop_id: int
+        :return: the value, 0 if not supported
+        :rtype: float
+        """
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._frames_read)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            fps = self._props.get(cv2.CAP_PROP_FPS, 0.0)
+            if (fps <= 0) or (self._frames_read == 0):
+                return 0.0
+            return (self._frames_read - 1) * 1000.0 / fps
+        return self._props.get(prop_id, 0.0)
+
+    def set(self, prop_id, value):
+        """
+        Setting properties is not supported.
+
+        :param prop_id: the cv2.CAP_PROP_* property to set
+        :type prop_id: int
+        :param value: the value to set
+        :return: always False
+        :rtype: bool
+        """
+        return False
+
+    def grab(self):
+        """
+        Decodes the next frame. A single packet can result in several frames,
+        which get queued up.
+
+        :return: whether a frame was decoded
+        :rtype: bool
+        """
+        self._frame = None
+        if self._decoder is None:
+            return False
+        while len(self._pending) == 0:
+            packet = next(self._packets, None)
+            if packet is None:
+                return False
+            self._pending.extend(self._decoder.Decode(packet))
+        self._frame = self._pending.popleft()
+        self._frames_read += 1
+        return True
+
+    def retrieve(self, image=None):
+        """
+        Returns the last decoded frame, either as GPU frame or as BGR array.
+
+        :param image: the optional array to store the BGR frame in
+        :type image: numpy.ndarray
+        :return: whether successful and the frame
+        :rtype: tuple
+        """
+        if self._frame is None:
+            return False, None
+        if self._device_frames:
+            return True, self._frame
+        if self._frame.framesize() != self._nv12.nbytes:
+            raise Exception("Decoded frame has %d bytes, but %d bytes expected for NV12 frame of %dx%d!"
+                            % (self._frame.framesize(), self._nv12.nbytes, self._width, self._height))
+        ctypes.memmove(self._nv12.ctypes.data, self._frame.GetPtrToPlane(0), self._nv12.nbytes)
+        if (image is not None) and (image.shape == (self._nv12.shape[0] * 2 // 3, self._nv12.shape[1], 3)):
+            frame = cv2.cvtColor(self._nv12, cv2.COLOR_YUV2BGR_NV12, dst=image)
+        else:
+            frame = cv2.cvtColor(self._nv12, cv2.COLOR_YUV2BGR_NV12)
+        if frame.shape[:2] != (self._height, self._width):
+            frame = frame[:self._height, :self._width]
+        return True, frame
+
+    def read(self, image=None):
+        """
+        Grabs and retrieves the next frame.
+
+        :param image: the optional array to store the BGR frame in
+        :type image: numpy.ndarray
+        :return: whether successful and the frame
+        :rtype: tuple
+        """
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def release(self):
+        """
+        Releases the decoder.
+        """
+        self._pending.clear()
+        self._frame = None
+        self._packets = None
+        self._decoder = None
+        self._demuxer = None
@@ -1,20 +1,39 @@
+from __future__ import annotations
+
 import cv2
+import functools
+import heapq
+import multiprocessing
+import numpy as np
 import os
-from typing import Callable, List
-from datetime import datetime
-
-
+import queue
+import stat
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Optional
+from ._ffmpeg import FFmpegCapture
+from ._gstreamer import file_pipeline, gstreamer_available, webcam_pipeline
+from ._jit import is_jitted, jitted_frame_processor
+from ._nvdec import NvDecCapture, nvdec_available
+
+
+@functools.lru_cache(maxsize=32)
 def decode_fourcc(cc):
     """
     Turns the float into a four letter codec string.
-    Taken from here:
+    Based on:
     https://stackoverflow.com/a/49138893/4698227
     :param cc: the codec as float
     :type cc: float
     :return: the codec string
     :rtype: str
     """
-    return "".join([chr((int(cc) >> 8 * i) & 0xFF) for i in range(4)])
+    return struct.pack("<I", int(cc) & 0xFFFFFFFF).decode("latin-1")
 
 
 def dummy_frame_processing(processor, frame, frame_no, pos_msec):
@@ -30,7 +49,9 @@ def dummy_frame_processing(processor, frame, frame_no, pos_msec):
     :param pos_msec: the current position in milli-seconds
     :type pos_msec: float
     """
-    ts = datetime.utcfromtimestamp(pos_msec / 1000.0).time().isoformat(timespec='milliseconds')
+    # rounded to micro-seconds first, like datetime does
+    t = round(pos_msec * 1000.0) // 1000
+    ts = "%02d:%02d:%02d.%03d" % ((t // 3600000) % 24, (t // 60000) % 60, (t // 1000) % 60, t % 1000)
     print("Processing: frame#=%d, timestamp=%s" % (frame_no, ts))
 
 
@@ -46,10 +67,341 @@ def dummy_processing_finished(processor, video_capture_opened):
     print("Processing finished (capture opened: %s)" % str(video_capture_opened))
 
 
+@functools.lru_cache(maxsize=128)
+def _check_file(path):
+    """
+    Checks whether the path exists and is not a directory, using a single stat call.
+    Only successful checks get cached, failures raise an exception.
+
+    :param path: the path to check
+    :type path: str
+    :return: always True
+    :rtype: bool
+    """
+    if stat.S_ISDIR(os.stat(path).st_mode):
+        raise IsADirectoryError(path)
+    return True
+
+
+def _video_file_error(path):
+    """
+    Checks whether the path points to an existing file. Positive results are cached,
+    a video file that disappears afterwards makes opening the video capture fail instead.
+
+    :param path: the path to check
+    :type path: str
+    :return: None if an existing file, otherwise the error message
+    :rtype: str
+    """
+    try:
+        _check_file(path)
+        return None
+    except IsADirectoryError:
+        return "Video file points to directory: %s" % path
+    except OSError:
+        return "Video file does not exist: %s" % path
+
+
+def _empty_pinned(shape):
+    """
+    Allocates an uint8 array in page-locked (pinned) host memory via PyTorch, which speeds up
+    the transfer to the GPU.
+
+    :param shape: the shape of the array
+    :type shape: tuple
+    :return: the array, None if PyTorch is not available or the allocation failed
+    :rtype: numpy.ndarray
+    """
+    try:
+        import torch
+        return torch.empty(shape, dtype=torch.uint8, pin_memory=True).numpy()
+    except Exception:
+        return None
+
+
+_worker_process_frame = None
+
+
+def _init_worker(process_frame):
+    """
+    Initializes a worker process of the pool.
+
+    :param process_frame: the method to call for processing a frame
+    :type process_frame: object
+    """
+    global _worker_process_frame
+    _worker_process_frame = process_frame
+
+
+def _attach_shared_memory(name):
+    """
+    Attaches to the shared memory block without registering it with the resource tracker.
+    The block is owned by the main process, which takes care of unlinking it. As forked workers
+    can share the resource tracker of the main process, unregistering the block again afterwards
+    would remove the registration of the main process.
+
+    :param name: the name of the shared memory block
+    :type name: str
+    :return: the shared memory block
+    :rtype: shared_memory.SharedMemory
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = _noop
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _process_in_worker(index, shm_name, shape, dtype, frame_no, pos_msec):
+    """
+    Processes a frame stored in shared memory within a worker process.
+    The processing method receives None instead of the processor.
+
+    :param index: the index of the shared memory block
+    :type index: int
+    :param shm_name: the name of the shared memory block containing the frame
+    :type shm_name: str
+    :param shape: the shape of the frame
+    :type shape: tuple
+    :param dtype: the data type of the frame
+    :type dtype: str
+    :param frame_no: the frame number
+    :type frame_no: int
+    :param pos_msec: the current position in milli-seconds
+    :type pos_msec: float
+    :return: the block index, frame number, position and the result of the processing method
+    :rtype: tuple
+    """
+    shm = _attach_shared_memory(shm_name)
+    try:
+        frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        result = _worker_process_frame(None, frame, frame_no, pos_msec)
+        del frame
+    finally:
+        shm.close()
+    return index, frame_no, pos_msec, result
+
+
+def _noop(*args, **kwargs):
+    """
+    Does nothing, used in place of disabled logging methods.
+    """
+    pass
+
+
+# the format for the timestamps in the log messages, without the micro-seconds
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 LOGGING_TYPE_INFO = 1
 LOGGING_TYPE_DEBUG = 2
 LOGGING_TYPE_ERROR = 3
 
+# the properties to query from the capture devices: name, property ID, optional conversion function
+_COMMON_PROPS = (
+    ("fps", cv2.CAP_PROP_FPS, None),
+    ("width", cv2.CAP_PROP_FRAME_WIDTH, None),
+    ("height", cv2.CAP_PROP_FRAME_HEIGHT, None),
+    ("codec", cv2.CAP_PROP_FOURCC, decode_fourcc),
+)
+
+_WEBCAM_PROPS = _COMMON_PROPS + (
+    ("brightness", cv2.CAP_PROP_BRIGHTNESS, None),
+    ("contrast", cv2.CAP_PROP_CONTRAST, None),
+    ("saturation", cv2.CAP_PROP_SATURATION, None),
+    ("hue", cv2.CAP_PROP_HUE, None),
+    ("gain", cv2.CAP_PROP_GAIN, None),
+    ("exposure", cv2.CAP_PROP_EXPOSURE, None),
+    ("gamma", cv2.CAP_PROP_GAMMA, None),
+    ("temperature", cv2.CAP_PROP_TEMPERATURE, None),
+    ("zoom", cv2.CAP_PROP_ZOOM, None),
+    ("focus", cv2.CAP_PROP_FOCUS, None),
+    ("iso_speed", cv2.CAP_PROP_ISO_SPEED, None),
+    ("backlight", cv2.CAP_PROP_BACKLIGHT, None),
+    ("pan", cv2.CAP_PROP_PAN, None),
+    ("tilt", cv2.CAP_PROP_TILT, None),
+    ("roll", cv2.CAP_PROP_ROLL, None),
+    ("iris", cv2.CAP_PROP_IRIS, None),
+    ("auto_focus", cv2.CAP_PROP_AUTOFOCUS, None),
+    ("auto_exposure", cv2.CAP_PROP_AUTO_EXPOSURE, None),
+    ("sharpness", cv2.CAP_PROP_SHARPNESS, None),
+    ("monochrome", cv2.CAP_PROP_MONOCHROME, None),
+    ("sample_aspect_ratio_num", cv2.CAP_PROP_SAR_NUM, None),
+    ("sample_aspect_ratio_den", cv2.CAP_PROP_SAR_DEN, None),
+    ("auto_white_balance", cv2.CAP_PROP_AUTO_WB, None),
+    ("white_balance_temperature", cv2.CAP_PROP_WB_TEMPERATURE, None),
+)
+
+_FILE_PROPS = _COMMON_PROPS + (
+    ("frame_count", cv2.CAP_PROP_FRAME_COUNT, None),
+    ("bitrate", cv2.CAP_PROP_BITRATE, None),
+    ("pixel_format", cv2.CAP_PROP_CODEC_PIXEL_FORMAT, decode_fourcc),
+)
+
+
+class _LazyCapInfo(Mapping):
+    """
+    Read-only dictionary that only queries the properties of the capture device when accessed.
+    Use dict(...) to obtain all the values, while the capture device is still open. Once detached
+    from the capture device, only the properties that were accessed beforehand are available.
+    Access to the capture device is synchronized via the lock, so that the properties can be queried
+    while the frames get decoded in a separate thread.
+    """
+
+    def __init__(self, video_capture, props):
+        """
+        Initializes the dictionary.
+
+        :param video_capture: the capture device to query
+        :type video_capture: cv2.VideoCapture
+        :param props: the tuples of name, property ID and optional conversion function
+        :type props: tuple
+        """
+        self._cap = video_capture
+        self._names = tuple(name for name, _, _ in props)
+        self._props = {name: (prop, conv) for name, prop, conv in props}
+        self._cache = dict()
+        self.lock = threading.Lock()
+
+    def __getitem__(self, name):
+        """
+        Returns the value of the property, querying the capture device on first access.
+
+        :param name: the name of the property
+        :type name: str
+        :return: the value
+        """
+        if name not in self._cache:
+            prop, conv = self._props[name]
+            with self.lock:
+                if self._cap is None:
+                    raise KeyError("Property '%s' was not accessed before the capture device got released, "
+                                   "use dict(params.info) while processing to obtain all properties" % name)
+                value = self._cap.get(prop)
+            self._cache[name] = value if conv is None else conv(value)
+        return self._cache[name]
+
+    def __iter__(self):
+        """
+        Returns an iterator over the property names, only the already queried ones if detached.
+
+        :return: the iterator
+        """
+        if self._cap is None:
+            return (name for name in self._names if name in self._cache)
+        return iter(self._names)
+
+    def __len__(self):
+        """
+        Returns the number of properties, only the already queried ones if detached.
+
+        :return: the number of properties
+        :rtype: int
+        """
+        if self._cap is None:
+            return len(self._cache)
+        return len(self._names)
+
+    def __repr__(self):
+        """
+        Returns a string representation of all the properties.
+
+        :return: the representation
+        :rtype: str
+        """
+        return repr(dict(self))
+
+    def detach(self):
+        """
+        Removes the reference to the capture device, before the latter gets released.
+        """
+        with self.lock:
+            self._cap = None
+
+
+class _SynchronizedCapture(object):
+    """
+    Wraps a capture device, synchronizing the access to it via the lock.
+    """
+
+    def __init__(self, video_capture, lock):
+        """
+        Initializes the wrapper.
+
+        :param video_capture: the capture device to wrap
+        :type video_capture: cv2.VideoCapture
+        :param lock: the lock to use
+        :type lock: threading.Lock
+        """
+        self._cap = video_capture
+        self._lock = lock
+
+    def isOpened(self):
+        """
+        Returns whether the capture device is open.
+
+        :return: True if open
+        :rtype: bool
+        """
+        with self._lock:
+            return self._cap.isOpened()
+
+    def get(self, prop_id):
+        """
+        Returns the specified property.
+
+        :param prop_id: the cv2.CAP_PROP_* property to return
+        :type prop_id: int
+        :return: the value
+        :rtype: float
+        """
+        with self._lock:
+            return self._cap.get(prop_id)
+
+    def set(self, prop_id, value):
+        """
+        Sets the specified property.
+
+        :param prop_id: the cv2.CAP_PROP_* property to set
+        :type prop_id: int
+        :param value: the value to set
+        :return: whether successful
+        :rtype: bool
+        """
+        with self._lock:
+            return self._cap.set(prop_id, value)
+
+    def grab(self):
+        """
+        Grabs the next frame.
+
+        :return: whether successful
+        :rtype: bool
+        """
+        with self._lock:
+            return self._cap.grab()
+
+    def read(self, image=None):
+        """
+        Grabs and retrieves the next frame.
+
+        :param image: the optional array to store the frame in
+        :type image: numpy.ndarray
+        :return: whether successful and the frame
+        :rtype: tuple
+        """
+        with self._lock:
+            return self._cap.read(image)
+
+
+BACKEND_OPENCV = "opencv"
+BACKEND_FFMPEG = "ffmpeg"
+BACKEND_NVDEC = "nvdec"
+BACKEND_GSTREAMER = "gstreamer"
+BACKENDS = [BACKEND_OPENCV, BACKEND_FFMPEG, BACKEND_NVDEC, BACKEND_GSTREAMER]
+
 
 def simple_logging(type, *args):
     """
@@ -76,8 +428,17 @@ class Processor(object):
     to the output directory itself (in case other processes are polling the output directory).
     """
 
+    __slots__ = ("_webcam_id", "_video_file", "_logging", "_verbose", "_output_timestamp", "nth_frame", "max_frames",
+                 "_process_frame", "_frame_processor", "_processing_finished", "_process_result", "is_listing_files",
+                 "is_processing_frames", "params", "prefetch", "buffer_size", "convert_rgb", "backend", "workers",
+                 "copy_frame", "seek", "use_async_io", "resize", "batch_size", "_batch_process_frame", "_frame_buf",
+                 "_batch", "_frame_nos", "_timestamps", "_resize_frames", "_stopped", "debug", "_log")
+
     def __init__(self, process_frame=None, processing_finished=None, nth_frame=1, max_frames=-1, logging=simple_logging,
-                 params=Parameters(), verbose=False, output_timestamp=False):
+                 params=Parameters(), verbose=False, output_timestamp=False, prefetch=0,
+                 buffer_size=1, convert_rgb=True, backend=BACKEND_OPENCV, workers=0, process_result=None,
+                 copy_frame=False, seek=False, use_async_io=False, resize=None, batch_size=1,
+                 batch_process_frame=None):
         """
         Initializes the processor.
 
@@ -97,10 +458,40 @@ class Processor(object):
         :type verbose: bool
         :param output_timestamp: whether to print a timestamp in the log messages
         :type output_timestamp: bool
+        :param prefetch: the number of frames to decode ahead in a separate thread, use <1 to decode in the main thread
+        :type prefetch: int
+        :param buffer_size: the number of frames the webcam buffers internally, None to use the backend's default
+        :type buffer_size: int
+        :param convert_rgb: whether to convert the frames to BGR, False returns the raw frames (eg MJPG)
+        :type convert_rgb: bool
+        :param backend: the backend to use for decoding video files (opencv|ffmpeg|nvdec|gstreamer),
+                        webcams use opencv unless gstreamer is selected
+        :type backend: str
+        :param workers: the number of worker processes to process the frames with, use <1 to process them in this process
+        :type workers: int
+        :param process_result: the method to call with the results returned by process_frame when using workers
+        :type process_result: object
+        :param copy_frame: whether to pass a copy of the frame to process_frame, as the frame buffer gets reused
+        :type copy_frame: bool
+        :param seek: whether to seek to the next frame to process in video files instead of skipping frames
+                     one by one, only worth it for large nth_frame as seeking can be slow for some containers
+        :type seek: bool
+        :param use_async_io: whether the ffmpeg backend reads video files asynchronously and pipes them into ffmpeg
+        :type use_async_io: bool
+        :param resize: the width and height to resize the frames to, None for no resize
+                       (gstreamer resizes within the pipeline, the other backends after decoding)
+        :type resize: tuple
+        :param batch_size: the number of frames to pass on to batch_process_frame at once, 1 uses process_frame
+        :type batch_size: int
+        :param batch_process_frame: the method to call for processing a batch of frames
+        :type batch_process_frame: object
         """
 
         self._webcam_id = None
         self._video_file = None
+        self._logging = None
+        self._verbose = False
+        self._output_timestamp = False
         self.nth_frame = nth_frame
         self.max_frames = max_frames
         self.process_frame = process_frame
@@ -111,6 +502,23 @@ class Processor(object):
         self.params = params
         self.verbose = verbose
         self.output_timestamp = output_timestamp
+        self.prefetch = prefetch
+        self.buffer_size = buffer_size
+        self.convert_rgb = convert_rgb
+        self.backend = backend
+        self.workers = workers
+        self.process_result = process_result
+        self.copy_frame = copy_frame
+        self.seek = seek
+        self.use_async_io = use_async_io
+        self.resize = resize
+        self.batch_size = batch_size
+        self.batch_process_frame = batch_process_frame
+        self._batch = None
+        self._frame_nos = None
+        self._timestamps = None
+        self._frame_buf = None
+        self._resize_frames = False
         self._stopped = False
 
     @property
@@ -124,7 +532,7 @@ class Processor(object):
         return self._logging
 
     @logging.setter
-    def logging(self, fn):
+    def logging(self, fn: Optional[Callable[..., None]]):
         """
         Sets the logging function.
 
@@ -132,6 +540,7 @@ class Processor(object):
         :type fn: function
         """
         self._logging = fn
+        self._update_log_methods()
 
     @property
     def process_frame(self):
@@ -144,7 +553,7 @@ class Processor(object):
         return self._process_frame
 
     @process_frame.setter
-    def process_frame(self, fn: Callable[[str, str, "Poller"], List[str]]):
+    def process_frame(self, fn: Optional[Callable[[Processor, np.ndarray, int, float], Any]]):
         """
         Sets the process frame function.
 
@@ -152,6 +561,8 @@ class Processor(object):
         :type fn: function
         """
         self._process_frame = fn
+        # numba-compiled methods cannot handle the processor object
+        self._frame_processor = jitted_frame_processor(fn) if is_jitted(fn) else fn
 
     @property
     def processing_finished(self):
@@ -164,7 +575,7 @@ class Processor(object):
         return self._processing_finished
 
     @processing_finished.setter
-    def processing_finished(self, fn: Callable[[str, str, "Poller"], List[str]]):
+    def processing_finished(self, fn: Optional[Callable[[Processor, bool], None]]):
         """
         Sets the processing finished function.
 
@@ -173,14 +584,108 @@ class Processor(object):
         """
         self._processing_finished = fn
 
-    def debug(self, *args):
+    @property
+    def batch_process_frame(self):
+        """
+        Returns the batch process frame method.
+
+        :return: the method in use
+        :rtype: function
+        """
+        return self._batch_process_frame
+
+    @batch_process_frame.setter
+    def batch_process_frame(self, fn: Optional[Callable[[Processor, np.ndarray, np.ndarray, np.ndarray], None]]):
+        """
+        Sets the batch process frame function.
+
+        :param fn: the method to use
+        :type fn: function
+        """
+        self._batch_process_frame = fn
+
+    @property
+    def process_result(self):
+        """
+        Returns the process result method.
+
+        :return: the method in use
+        :rtype: function
+        """
+        return self._process_result
+
+    @process_result.setter
+    def process_result(self, fn: Optional[Callable[[Processor, Any, int, float], None]]):
+        """
+        Sets the process result function.
+
+        :param fn: the method to use
+        :type fn: function
+        """
+        self._process_result = fn
+
+    @property
+    def verbose(self):
+        """
+        Returns whether verbose logging is enabled.
+
+        :return: True if verbose
+        :rtype: bool
+        """
+        return self._verbose
+
+    @verbose.setter
+    def verbose(self, verbose):
+        """
+        Sets whether to output debug messages.
+
+        :param verbose: True if verbose
+        :type verbose: bool
+        """
+        self._verbose = verbose
+        self._update_log_methods()
+
+    @property
+    def output_timestamp(self):
+        """
+        Returns whether log messages get prefixed with a timestamp.
+
+        :return: True if prefixed
+        :rtype: bool
+        """
+        return self._output_timestamp
+
+    @output_timestamp.setter
+    def output_timestamp(self, output_timestamp):
+        """
+        Sets whether to prefix the log messages with a timestamp.
+
+        :param output_timestamp: True if to prefix
+        :type output_timestamp: bool
         """
-        Outputs the arguments via 'log' if verbose is enabled.
+        self._output_timestamp = output_timestamp
+        self._update_log_methods()
+
+    def _update_log_methods(self):
+        """
+        Binds the 'debug' and '_log' methods according to the current logging settings,
+        so that disabled logging does not incur any checks.
+        """
+        if self._logging is None:
+            self._log = _noop
+        elif self._output_timestamp:
+            self._log = self._log_with_ts
+        else:
+            self._log = self._logging
+        self.debug = self._log_debug if self._verbose else _noop
+
+    def _log_debug(self, *args):
+        """
+        Outputs the arguments via 'log', used as 'debug' method if verbose is enabled.
 
         :param args: the debug arguments to output
         """
-        if self.verbose:
-            self._log(LOGGING_TYPE_DEBUG, *args)
+        self._log(LOGGING_TYPE_DEBUG, *args)
 
     def info(self, *args):
         """
@@ -198,17 +703,18 @@ class Processor(object):
         """
         self._log(LOGGING_TYPE_ERROR, *args)
 
-    def _log(self, type, *args):
+    def _log_with_ts(self, type, *args):
         """
-        Outputs the arguments via the logging function.
+        Outputs the arguments prefixed with a timestamp via the logging function,
+        used as '_log' method if output_timestamp is enabled.
 
+        :param type: the message type
+        :type type: int
         :param args: the arguments to output
         """
-        if self._logging is not None:
-            if self.output_timestamp:
-                self._logging(type, *("%s - " % str(datetime.now()), *args))
-            else:
-                self._logging(type, *args)
+        now = time.time()
+        ts = time.strftime(_TIMESTAMP_FORMAT, time.localtime(now))
+        self._logging(type, "%s.%06d - " % (ts, int((now % 1.0) * 1000000)), *args)
 
     def keyboard_interrupt(self):
         """
@@ -244,123 +750,537 @@ class Processor(object):
         """
         return self.is_processing_frames
 
-    def _check(self):
+    def _check(self, require_process_frame=True):
         """
         For performing checks before starting the polling.
         Raises an exception if any check should fail.
+
+        :param require_process_frame: whether a process_frame method is required
+        :type require_process_frame: bool
         """
 
+        msg = None
+        # the nvdec backend can supply the frames in GPU memory rather than as numpy arrays
+        gpu_frames = (self._video_file is not None) and (self.backend == BACKEND_NVDEC) \
+            and getattr(self.params, "wants_gpu", False)
         if (self._webcam_id is None) and (self._video_file is None):
-            raise Exception("Neither webcam ID nor video file supplied!")
-        if self._video_file is not None:
-            if not os.path.exists(self._video_file):
-                raise Exception("Video file does not exist: %s" % self._video_file)
-            if os.path.isdir(self._video_file):
-                raise Exception("Video file points to directory: %s" % self._video_file)
-        if self.process_frame is None:
-            raise Exception("No method for processing frames supplied!")
-        
+            msg = "Neither webcam ID nor video file supplied!"
+        elif self._video_file is not None:
+            msg = _video_file_error(self._video_file)
+        if (msg is None) and require_process_frame:
+            if self.batch_size > 1:
+                if self.batch_process_frame is None:
+                    msg = "No method for processing batches of frames supplied!"
+                elif self.workers > 0:
+                    msg = "Batches of frames cannot be processed with workers!"
+                elif gpu_frames:
+                    msg = "Batches of frames cannot be formed from frames in GPU memory (wants_gpu)!"
+            elif self.process_frame is None:
+                msg = "No method for processing frames supplied!"
+            elif (self.workers > 0) and gpu_frames:
+                msg = "Frames in GPU memory (wants_gpu) cannot be processed with workers!"
+        if (msg is None) and self.copy_frame and gpu_frames:
+            msg = "Frames in GPU memory (wants_gpu) cannot be copied (copy_frame)!"
+        if (msg is None) and (self.backend not in BACKENDS):
+            msg = "Unknown backend '%s', available: %s" % (self.backend, ", ".join(BACKENDS))
+        if (msg is None) and self.use_async_io and (self.backend != BACKEND_FFMPEG):
+            msg = "Asynchronous I/O (use_async_io) is only supported by the ffmpeg backend!"
+        if (msg is None) and (self.resize is not None):
+            if not self.convert_rgb:
+                msg = "Raw frames (convert_rgb=False) cannot be resized!"
+            elif gpu_frames:
+                msg = "Frames in GPU memory (wants_gpu) cannot be resized!"
+        if msg is not None:
+            raise Exception(msg)
+
     def _retrieve_info(self, video_capture):
         """
         Returns a dictionary with information about the opened device.
+        For webcams, the properties only get queried when accessed.
         
         :param video_capture: the capture device to query
         :type video_capture: cv2.VideoCapture
         :return: the device information
         :rtype: dict
         """
-        result = dict()
-
-        result["fps"] = video_capture.get(cv2.CAP_PROP_FPS)
-        result["width"] = video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)
-        result["height"] = video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
-        result["codec"] = decode_fourcc(video_capture.get(cv2.CAP_PROP_FOURCC))
-
         if self._webcam_id is not None:
-            result["brightness"] = video_capture.get(cv2.CAP_PROP_CONTRAST)
-            result["contrast"] = video_capture.get(cv2.CAP_PROP_CONTRAST)
-            result["saturation"] = video_capture.get(cv2.CAP_PROP_SATURATION)
-            result["hue"] = video_capture.get(cv2.CAP_PROP_HUE)
-            result["gain"] = video_capture.get(cv2.CAP_PROP_GAIN)
-            result["exposure"] = video_capture.get(cv2.CAP_PROP_EXPOSURE)
-            result["whitebalance"] = video_capture.get(cv2.CAP_PROP_WB_TEMPERATURE)
-            result["gamma"] = video_capture.get(cv2.CAP_PROP_GAMMA)
-            result["temperature"] = video_capture.get(cv2.CAP_PROP_TEMPERATURE)
-            result["zoom"] = video_capture.get(cv2.CAP_PROP_ZOOM)
-            result["focus"] = video_capture.get(cv2.CAP_PROP_FOCUS)
-            result["iso_speed"] = video_capture.get(cv2.CAP_PROP_ISO_SPEED)
-            result["backlight"] = video_capture.get(cv2.CAP_PROP_BACKLIGHT)
-            result["pan"] = video_capture.get(cv2.CAP_PROP_PAN)
-            result["tilt"] = video_capture.get(cv2.CAP_PROP_TILT)
-            result["roll"] = video_capture.get(cv2.CAP_PROP_ROLL)
-            result["iris"] = video_capture.get(cv2.CAP_PROP_IRIS)
-            result["auto_focus"] = video_capture.get(cv2.CAP_PROP_AUTOFOCUS)
-            result["auto_exposure"] = video_capture.get(cv2.CAP_PROP_AUTO_EXPOSURE)
-            result["sharpness"] = video_capture.get(cv2.CAP_PROP_SHARPNESS)
-            result["monochrome"] = video_capture.get(cv2.CAP_PROP_MONOCHROME)
-            result["sample_aspect_ratio_num"] = video_capture.get(cv2.CAP_PROP_SAR_NUM)
-            result["sample_aspect_ratio_den"] = video_capture.get(cv2.CAP_PROP_SAR_DEN)
-            result["auto_white_balance"] = video_capture.get(cv2.CAP_PROP_AUTO_WB)
-            result["white_balance_temperature"] = video_capture.get(cv2.CAP_PROP_WB_TEMPERATURE)
+            return _LazyCapInfo(video_capture, _WEBCAM_PROPS)
+        get = video_capture.get
+        return {name: get(prop) if conv is None else conv(get(prop)) for name, prop, conv in _FILE_PROPS}
+        
+    def _open_capture(self):
+        """
+        Opens the capture device for the webcam or video file.
+
+        :return: the capture device
+        :rtype: cv2.VideoCapture
+        """
+        gstreamer = self.backend == BACKEND_GSTREAMER
+        if gstreamer and not gstreamer_available():
+            self.error("opencv was built without GStreamer support, falling back to opencv!")
+            gstreamer = False
+        # other than in the gstreamer pipeline, the frames get resized after decoding
+        self._resize_frames = (self.resize is not None) and not gstreamer
+        if self._video_file is not None:
+            self.info("Opening file: %s" % self._video_file)
+            if gstreamer:
+                return cv2.VideoCapture(file_pipeline(self._video_file, resize=self.resize), cv2.CAP_GSTREAMER)
+            if self.backend == BACKEND_FFMPEG:
+                return FFmpegCapture(self._video_file, async_io=self.use_async_io)
+            if self.backend == BACKEND_NVDEC:
+                if nvdec_available():
+                    return NvDecCapture(self._video_file, gpu_id=getattr(self.params, "gpu_id", 0),
+                                        device_frames=getattr(self.params, "wants_gpu", False))
+                self.error("PyNvVideoCodec not available, falling back to opencv!")
+            video_capture = cv2.VideoCapture(self._video_file)
         else:
-            result["frame_count"] = video_capture.get(cv2.CAP_PROP_FRAME_COUNT)
-            result["bitrate"] = video_capture.get(cv2.CAP_PROP_BITRATE)
-            result["pixel_format"] = decode_fourcc(video_capture.get(cv2.CAP_PROP_CODEC_PIXEL_FORMAT))
+            self.info("Opening webcam: %d" % self._webcam_id)
+            if gstreamer:
+                return cv2.VideoCapture(webcam_pipeline(self._webcam_id, resize=self.resize), cv2.CAP_GSTREAMER)
+            video_capture = cv2.VideoCapture(self._webcam_id)
+            if self.buffer_size is not None:
+                video_capture.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        if not self.convert_rgb:
+            video_capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        return video_capture
 
+    def _frame_shape(self):
+        """
+        Returns the shape of the BGR frames, based on the width/height to resize to or the ones in the info.
+
+        :return: the shape
+        :rtype: tuple
+        """
+        if self._resize_frames:
+            return int(self.resize[1]), int(self.resize[0]), 3
+        return int(self.params.info["height"]), int(self.params.info["width"]), 3
+
+    def _allocate_frame_buffers(self, count):
+        """
+        Allocates the buffers that the frames get decoded into, based on the frame shape.
+        If 'gpu_callback' is set to True in the params, pinned memory is used.
+
+        :param count: the number of buffers to allocate
+        :type count: int
+        :return: the buffers
+        :rtype: list
+        """
+        shape = self._frame_shape()
+        result = None
+        if getattr(self.params, "gpu_callback", False):
+            result = [_empty_pinned(shape) for _ in range(count)]
+            if None in result:
+                self.error("Failed to allocate pinned memory (PyTorch and CUDA required), using pageable memory!")
+                result = None
+        if result is None:
+            result = [np.empty(shape, np.uint8) for _ in range(count)]
+        self._frame_buf = result[0]
         return result
-        
-    def process(self, webcam_id=None, video_file=None):
+
+    def _read_frames(self, video_capture, buffers=None):
         """
-        Performs the processing.
+        Reads the frames from the capture device, honoring nth_frame and max_frames.
+        The frames get decoded (or resized) into the buffers in turn, if provided.
 
-        :param webcam_id: the ID of the webcam to retrieve frames from
+        :param video_capture: the capture device to read from
+        :type video_capture: cv2.VideoCapture
+        :param buffers: the preallocated frame buffers to cycle through
+        :type buffers: list
+        :return: generator of frame, frame number and position in milli-seconds
+        """
+        frame_no = 0
+        kept = 0
+        num_buffers = 0 if buffers is None else len(buffers)
+        dsize = (int(self.resize[0]), int(self.resize[1])) if self._resize_frames else None
+        # the buffer for the frames before resizing
+        decoded = None
+        seek = self.seek and (self._video_file is not None) and (self.nth_frame > 1)
+        # for video files, the position is derived from the frame number rather than queried from the capture
+        ms_per_frame = None
+        if self._video_file is not None:
+            fps = self.params.info["fps"]
+            if fps > 0:
+                ms_per_frame = 1000.0 / fps
+        while video_capture.isOpened() and not self.is_stopped:
+            next_no = frame_no + 1
+            if seek and ((next_no % self.nth_frame) != 0):
+                target = (next_no // self.nth_frame + 1) * self.nth_frame
+                if ((self.max_frames <= 0) or (target <= self.max_frames)) \
+                        and video_capture.set(cv2.CAP_PROP_POS_FRAMES, target - 1):
+                    frame_no = target - 1
+                    next_no = target
+            # skipped frames only get grabbed, not retrieved
+            if (next_no % self.nth_frame) == 0:
+                buffer = buffers[kept % num_buffers] if num_buffers > 0 else None
+                if dsize is not None:
+                    ret, decoded = video_capture.read(decoded)
+                    frame = cv2.resize(decoded, dsize, dst=buffer) if ret else None
+                elif buffer is not None:
+                    ret, frame = video_capture.read(buffer)
+                else:
+                    ret, frame = video_capture.read()
+            else:
+                ret = video_capture.grab()
+                frame = None
+            if not ret:
+                break
+            frame_no = next_no
+            if frame is not None:
+                kept += 1
+                if ms_per_frame is not None:
+                    yield frame, frame_no, (frame_no - 1) * ms_per_frame
+                else:
+                    yield frame, frame_no, video_capture.get(cv2.CAP_PROP_POS_MSEC)
+
+            if (self.max_frames > 0) and (frame_no >= self.max_frames):
+                self.info("Reached maximum number of frames: %d" % self.max_frames)
+                break
+
+    def _process_single(self, frame, frame_no, pos_msec):
+        """
+        Passes a single frame on to the process_frame method.
+
+        :param frame: the frame
+        :type frame: numpy.ndarray
+        :param frame_no: the frame number
+        :type frame_no: int
+        :param pos_msec: the current position in milli-seconds
+        :type pos_msec: float
+        """
+        if self.copy_frame:
+            frame = frame.copy()
+        self.is_processing_frames = True
+        self._frame_processor(self, frame, frame_no, pos_msec)
+        self.is_processing_frames = False
+
+    def _decode_loop(self, video_capture, buffers, frames, abort, errors):
+        """
+        Decodes the frames in a separate thread and places them in the queue.
+        A None in the queue signals the end of the frames.
+
+        :param video_capture: the capture device to read from
+        :type video_capture: cv2.VideoCapture
+        :param buffers: the preallocated frame buffers to cycle through
+        :type buffers: list
+        :param frames: the queue for the decoded frames
+        :type frames: queue.Queue
+        :param abort: gets set when the consumer is no longer interested in frames
+        :type abort: threading.Event
+        :param errors: for storing any exception that occurred while decoding
+        :type errors: list
+        """
+        try:
+            for item in self._read_frames(video_capture, buffers):
+                if abort.is_set():
+                    break
+                frames.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            frames.put(None)
+
+    def _iter_prefetched(self, video_capture):
+        """
+        Generator for the frames that get decoded in a separate thread.
+        The capture device must not be accessed while iterating, other than via the info in the params.
+
+        :param video_capture: the capture device to read from
+        :type video_capture: cv2.VideoCapture
+        :return: generator of frame, frame number and position in milli-seconds
+        """
+        frames = queue.Queue(maxsize=self.prefetch)
+        abort = threading.Event()
+        errors = []
+        # besides the queued frames, one buffer is held by the consumer and one is being decoded into
+        buffers = self._allocate_frame_buffers(self.prefetch + 2)
+        # lazy queries of the info must not access the capture device while decoding
+        if isinstance(self.params.info, _LazyCapInfo):
+            video_capture = _SynchronizedCapture(video_capture, self.params.info.lock)
+        decoder = threading.Thread(target=self._decode_loop, args=(video_capture, buffers, frames, abort, errors),
+                                   daemon=True)
+        decoder.start()
+        try:
+            while not self.is_stopped:
+                item = frames.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            # drain the queue to unblock the decoder thread
+            abort.set()
+            while decoder.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            decoder.join()
+        if len(errors) > 0:
+            raise errors[0]
+
+    def _iter_decoded(self, video_capture):
+        """
+        Generator for the frames of the opened capture device, decoded either in this
+        or in a separate thread (prefetch).
+
+        :param video_capture: the capture device to read from
+        :type video_capture: cv2.VideoCapture
+        :return: generator of frame, frame number and position in milli-seconds
+        """
+        if self.prefetch > 0:
+            return self._iter_prefetched(video_capture)
+        return self._read_frames(video_capture, self._allocate_frame_buffers(1))
+
+    def _handle_worker_result(self, result, ordered, submitted, heap):
+        """
+        Passes on the result from a worker process to the process_result method.
+        In ordered mode, results get held back until all previous frames have been passed on.
+
+        :param result: the frame number, position and result of the processing method
+        :type result: tuple
+        :param ordered: whether to pass on the results in frame order
+        :type ordered: bool
+        :param submitted: the frame numbers in order of submission
+        :type submitted: deque
+        :param heap: the heap with the results that were held back
+        :type heap: list
+        """
+        if not ordered:
+            submitted.remove(result[0])
+            ready = [result]
+        else:
+            heapq.heappush(heap, result)
+            ready = []
+            while (len(heap) > 0) and (heap[0][0] == submitted[0]):
+                ready.append(heapq.heappop(heap))
+                submitted.popleft()
+        for frame_no, pos_msec, res in ready:
+            if self.process_result is not None:
+                self.is_processing_frames = True
+                self.process_result(self, res, frame_no, pos_msec)
+                self.is_processing_frames = False
+
+    def _process_with_workers(self, video_capture):
+        """
+        Processes the frames using a pool of worker processes. The frames get passed on
+        via a ring of shared memory blocks. The results returned by process_frame get
+        passed on to the process_result method, in order of arrival unless the 'ordered'
+        parameter is set to True.
+
+        :param video_capture: the capture device to read from
+        :type video_capture: cv2.VideoCapture
+        """
+        ordered = getattr(self.params, "ordered", False)
+        done = queue.Queue()
+        submitted = deque()
+        heap = []
+        blocks = []
+        free = deque()
+        pending = 0
+        shape = None
+        dtype = None
+
+        def on_error(e):
+            done.put(e)
+
+        def next_result():
+            item = done.get()
+            if isinstance(item, BaseException):
+                raise item
+            index, frame_no, pos_msec, result = item
+            free.append(index)
+            self._handle_worker_result((frame_no, pos_msec, result), ordered, submitted, heap)
+
+        pool = multiprocessing.Pool(processes=self.workers, initializer=_init_worker, initargs=(self.process_frame,))
+        try:
+            for frame, frame_no, pos_msec in self._read_frames(video_capture, self._allocate_frame_buffers(1)):
+                if shape is None:
+                    shape = frame.shape
+                    dtype = frame.dtype
+                    for i in range(self.workers + 2):
+                        blocks.append(shared_memory.SharedMemory(create=True, size=frame.nbytes))
+                        free.append(i)
+                elif frame.shape != shape:
+                    raise Exception("Frame shape changed from %s to %s!" % (str(shape), str(frame.shape)))
+                while len(free) == 0:
+                    next_result()
+                    pending -= 1
+                index = free.popleft()
+                np.copyto(np.ndarray(shape, dtype=dtype, buffer=blocks[index].buf), frame)
+                submitted.append(frame_no)
+                pool.apply_async(_process_in_worker, (index, blocks[index].name, shape, dtype.str, frame_no, pos_msec),
+                                 callback=done.put, error_callback=on_error)
+                pending += 1
+            while pending > 0:
+                next_result()
+                pending -= 1
+        finally:
+            pool.terminate()
+            pool.join()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def _process_batched(self, video_capture):
+        """
+        Collects the frames in a preallocated batch and passes on full batches (and the
+        remaining frames at the end) to the batch_process_frame method. Without prefetch,
+        the frames get decoded directly into the batch. If the frames differ from BGR frames
+        in shape or type (eg convert_rgb=False), the batch gets allocated based on the first frame.
+
+        :param video_capture: the capture device to read from
+        :type video_capture: cv2.VideoCapture
+        """
+        self._batch = np.empty((self.batch_size,) + self._frame_shape(), np.uint8)
+        self._frame_nos = np.empty(self.batch_size, np.int64)
+        self._timestamps = np.empty(self.batch_size, np.float64)
+        rows = list(self._batch)
+        if self.prefetch > 0:
+            frames = self._iter_prefetched(video_capture)
+        else:
+            frames = self._read_frames(video_capture, rows)
+
+        count = 0
+        first = True
+        for frame, frame_no, pos_msec in frames:
+            # only copy if not decoded into the batch already
+            if frame is not rows[count]:
+                if first and ((frame.shape != self._batch.shape[1:]) or (frame.dtype != self._batch.dtype)):
+                    self._batch = np.empty((self.batch_size,) + frame.shape, frame.dtype)
+                    # also used by _read_frames for decoding into
+                    rows[:] = list(self._batch)
+                elif frame.shape != self._batch.shape[1:]:
+                    raise Exception("Frame shape changed from %s to %s!"
+                                    % (str(self._batch.shape[1:]), str(frame.shape)))
+                rows[count][...] = frame
+            first = False
+            self._frame_nos[count] = frame_no
+            self._timestamps[count] = pos_msec
+            count += 1
+            if count == self.batch_size:
+                self._process_batch(count)
+                count = 0
+        if count > 0:
+            self._process_batch(count)
+
+        self._batch = None
+        self._frame_nos = None
+        self._timestamps = None
+
+    def _process_batch(self, count):
+        """
+        Passes the first frames of the batch on to the batch_process_frame method.
+
+        :param count: the number of frames in the batch
+        :type count: int
+        """
+        frames = self._batch[:count]
+        if self.copy_frame:
+            frames = frames.copy()
+        self.is_processing_frames = True
+        self.batch_process_frame(self, frames, self._frame_nos[:count], self._timestamps[:count])
+        self.is_processing_frames = False
+
+    def _start(self, webcam_id, video_file, require_process_frame):
+        """
+        Performs the checks and opens the capture device.
+
+        :param webcam_id: the ID of the webcam to use
         :type webcam_id: int
-        :param video_file: the video file to process
+        :param video_file: the video file to use
         :type video_file: str
+        :param require_process_frame: whether a process_frame method is required
+        :type require_process_frame: bool
+        :return: the capture device
+        :rtype: cv2.VideoCapture
         """
-
         self._stopped = False
         self._webcam_id = webcam_id
         self._video_file = video_file
-        self._check()
+        self._check(require_process_frame=require_process_frame)
 
-        if self._video_file is not None:
-            self.info("Opening file: %s" % self._video_file)
-            video_capture = cv2.VideoCapture(self._video_file)
-        else:
-            self.info("Opening webcam: %d" % self._webcam_id)
-            video_capture = cv2.VideoCapture(self._webcam_id)
+        video_capture = self._open_capture()
         self.params.video_capture = video_capture
-
-        frame_no = 0
         if not video_capture.isOpened():
-            video_capture_opened = False
             self.error("Failed to open video capture!")
-        else:
-            video_capture_opened = True
-            self.params.info = self._retrieve_info(video_capture)
-            if self.verbose:
-                self.info("Info:", self.params.info)
-
-            while video_capture.isOpened() and not self.is_stopped:
-                ret, frame = video_capture.read()
-                if not ret:
-                    break
-                frame_no += 1
-                if (frame_no % self.nth_frame) == 0:
-                    self.is_processing_frames = True
-                    self.process_frame(self, frame, frame_no, video_capture.get(cv2.CAP_PROP_POS_MSEC))
-                    self.is_processing_frames = False
-
-                if (self.max_frames > 0) and (frame_no >= self.max_frames):
-                    self.info("Reached maximum number of frames: %d" % self.max_frames)
-                    break
+        return video_capture
+
+    def _release(self, video_capture):
+        """
+        Releases the capture device, detaching any lazily queried information beforehand.
 
+        :param video_capture: the capture device to release
+        :type video_capture: cv2.VideoCapture
+        """
+        info = getattr(self.params, "info", None)
+        if isinstance(info, _LazyCapInfo):
+            info.detach()
         video_capture.release()
 
+    def _init_info(self, video_capture):
+        """
+        Stores the information about the opened capture device in the params.
+
+        :param video_capture: the capture device to query
+        :type video_capture: cv2.VideoCapture
+        """
+        self.params.info = self._retrieve_info(video_capture)
+        if self.verbose:
+            self.info("Info:", self.params.info)
+
+    def process(self, webcam_id=None, video_file=None):
+        """
+        Performs the processing.
+
+        :param webcam_id: the ID of the webcam to retrieve frames from
+        :type webcam_id: int
+        :param video_file: the video file to process
+        :type video_file: str
+        """
+
+        video_capture = self._start(webcam_id, video_file, True)
+        video_capture_opened = video_capture.isOpened()
+        if video_capture_opened:
+            self._init_info(video_capture)
+            if self.workers > 0:
+                self._process_with_workers(video_capture)
+            elif self.batch_size > 1:
+                self._process_batched(video_capture)
+            else:
+                for frame, frame_no, pos_msec in self._iter_decoded(video_capture):
+                    self._process_single(frame, frame_no, pos_msec)
+            self._frame_buf = None
+
+        self._release(video_capture)
+
         if self.processing_finished is not None:
             self.processing_finished(self, video_capture_opened)
 
+    def iter_frames(self, webcam_id=None, video_file=None):
+        """
+        Generator for the frames of the webcam or video file, as an alternative to supplying
+        a process_frame method. As with process_frame, the frames get decoded into buffers that
+        get reused (see copy_frame). The capture device gets released once the generator
+        is exhausted or closed.
+
+        :param webcam_id: the ID of the webcam to retrieve frames from
+        :type webcam_id: int
+        :param video_file: the video file to retrieve frames from
+        :type video_file: str
+        :return: generator of frame, frame number and position in milli-seconds
+        """
+
+        video_capture = self._start(webcam_id, video_file, False)
+        try:
+            if video_capture.isOpened():
+                self._init_info(video_capture)
+                for frame, frame_no, pos_msec in self._iter_decoded(video_capture):
+                    if self.copy_frame:
+                        frame = frame.copy()
+                    yield frame, frame_no, pos_msec
+        finally:
+            self._frame_buf = None
+            self._release(video_capture)
+
     def query(self, webcam_id=None, video_file=None):
         """
         Returns information on the webcam or video file.
@@ -373,25 +1293,12 @@ class Processor(object):
         :rtype: dict
         """
 
-        self._stopped = False
-        self._webcam_id = webcam_id
-        self._video_file = video_file
-        self._check()
-
-        if self._video_file is not None:
-            self.info("Opening file: %s" % self._video_file)
-            video_capture = cv2.VideoCapture(self._video_file)
-        else:
-            self.info("Opening webcam: %d" % self._webcam_id)
-            video_capture = cv2.VideoCapture(self._webcam_id)
-        self.params.video_capture = video_capture
-
+        video_capture = self._start(webcam_id, video_file, False)
         if not video_capture.isOpened():
             result = None
-            self.error("Failed to open video capture!")
         else:
-            result = self._retrieve_info(video_capture)
+            result = dict(self._retrieve_info(video_capture))
 
         video_capture.release()
 
-        return result
\ No newline at end of file
+        return result